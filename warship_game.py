@@ -2,31 +2,74 @@
 import os
 import sys
 import logging as log
-import itertools as it
 
 from time import sleep
-from functools import reduce
-from random import randint
+from functools import lru_cache
+from random import Random
 
-log.basicConfig(level=log.DEBUG)
+log.basicConfig(level=log.WARNING)
 
 TURNS = 35
+RNG = Random()  # seeded once from os.urandom at import
+CLEAR_SCREEN = b"\x1b[2J\x1b[H"  # clear the terminal and move the cursor home
+VALID_INPUTS = frozenset("0123456789")
 SHIPS_LEN = {"A": 5, "B": 4, "S": 3, "D": 3, "P": 2}
 
+# (row step, col step) taken by each cell of a ship in a given orientation
+DIRECTIONS = {"v": (1, 0), "h": (0, 1)}
 
-def generate_board(dim: int = 10, filler: str = "~") -> [[str]]:
-    """Generate a new board object"""
-    return [[filler] * dim for _ in range(dim)]
+# (row, col) offsets of a cell and the 8 cells around it, used to build NEIGHBOR_MASKS
+NEIGHBORS = tuple((dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+
+# per cell index, a bitmask with bit `row * 10 + col` set for each on-board neighbour
+NEIGHBOR_MASKS = tuple(
+    sum(
+        1 << ((row + dr) * 10 + col + dc)
+        for dr, dc in NEIGHBORS
+        if 0 <= row + dr < 10 and 0 <= col + dc < 10
+    )
+    for row in range(10)
+    for col in range(10)
+)
+
+# every in-bounds (row, col, orientation) for each ship length on a 10x10 board
+PLACEMENTS = {
+    ship_len: [(row, col, "v") for row in range(11 - ship_len) for col in range(10)]
+    + [(row, col, "h") for row in range(10) for col in range(11 - ship_len)]
+    for ship_len in set(SHIPS_LEN.values())
+}
+
+
+def _place_v(board: bytearray, row: int, col: int, ship: int, ship_len: int) -> None:
+    start = row * 10 + col
+    board[start : start + 10 * ship_len : 10] = bytes([ship]) * ship_len
+
+
+def _place_h(board: bytearray, row: int, col: int, ship: int, ship_len: int) -> None:
+    start = row * 10 + col
+    board[start : start + ship_len] = bytes([ship]) * ship_len
+
+
+# ship writers per orientation, used by place_ship
+_PLACE = {"v": _place_v, "h": _place_h}
+
+
+def generate_board(dim: int = 10, filler: str = "~") -> bytearray:
+    """Generate a new board object
+
+    The board is a flat buffer of `dim * dim` bytes, indexed as `board[row * dim + col]`
+    """
+    return bytearray(filler.encode() * (dim * dim))
 
 
 def place_ship(
     row: int,
     col: int,
-    board: [[str]],
+    board: bytearray,
     ship: str,
     orientation: str = "v",
     filler: str = "~",
-) -> (bool, [[str]]):
+) -> (bool, bytearray):
     """
     Place the ship into a required location.
 
@@ -37,14 +80,14 @@ def place_ship(
 
     Note:
     -----
-    This function alters the original board. So if you have a list make sure you are aware that
-    the underlying data of the list will be changed.
+    This function alters the original board. So if you have a bytearray make sure you are aware
+    that the underlying data of the bytearray will be changed.
 
     Parameters:
     -----------
     row: int
     col: int
-    board: [[str]]
+    board: bytearray
     ship: str
     orientation: str
 
@@ -61,92 +104,90 @@ def place_ship(
     if not valid:
         return fallback
 
-    if orientation == "v":
-        for i in range(ship_len):
-            board[row + i][col] = ship
-        return (True, board)
-
-    elif orientation == "h":
-        for i in range(ship_len):
-            board[row][col + i] = ship
-        return (True, board)
-    else:
-        raise ValueError("Incorrect orientation provided")
+    # validate_bounds has already rejected any orientation missing from _PLACE
+    _PLACE[orientation](board, row, col, ord(ship), ship_len)
+    return (True, board)
 
 
 def validate_bounds(
-    board: [[str]], row: int, col: int, ship_len: int, orientation: str, filler="~"
+    board: bytearray, row: int, col: int, ship_len: int, orientation: str, filler="~"
 ) -> bool:
     """Validate bounds.
 
     Currently this takes a ship length and the position that the player wants to put it into.
 
-    It also check the orientation. Because I realised that if I check the length + row and length + col
-    at all times, then it will fail when you're trying to put stuff at the very end of the board
-    horizontally.
-
+    The orientation picks the (row, col) step from `DIRECTIONS`, so the same check covers
+    both orientations: the last cell of the ship has to be on the board and every cell it
+    covers has to still be filler.
     """
-    "TODO: make sure this adds up with the right length "
-
-    if orientation == "v" and ((row + ship_len) < 10):
-        for i in range(ship_len):
-            if board[row + i][col] != filler:
-                log.debug(
-                    f"Could not place ship vertically. Coordinate {(col, row+i)} is already occupied"
-                )
-                return False
-
-    elif orientation == "h" and ((col + ship_len) < 10):
-        for i in range(ship_len):
-            if board[row][col + i] != filler:
-                log.debug(
-                    f"Could not place ship horizontally. Coordinate {(col+i, row)} is already occupied"
-                )
-                return False
-
-    elif orientation not in ["h", "v"]:
-        log.debug(f"Could not place ship of length {ship_len} in position {(row, col)}")
+    if orientation not in DIRECTIONS:
+        log.debug(
+            "Could not place ship of length %s in position %s", ship_len, (row, col)
+        )
         return False
 
-    # NOTE: this is annoying that i have to repeat myself. Might need to abstract the predicates
-    # TODO: refactor all these conditionals but for now it works.
-    elif (row + ship_len) >= 10 or (col + ship_len) >= 10:
+    dr, dc = DIRECTIONS[orientation]
+    end_row, end_col = row + dr * (ship_len - 1), col + dc * (ship_len - 1)
+    if row < 0 or col < 0 or end_row >= 10 or end_col >= 10:
+        return False
+
+    # the ship's cells are a strided slice of the flat board: step 10 down, step 1 across
+    start, step = row * 10 + col, dr * 10 + dc
+    if board[start : start + step * ship_len : step].count(ord(filler)) != ship_len:
+        log.debug(
+            "Could not place ship in position %s. Coordinates are already occupied",
+            (row, col),
+        )
         return False
 
     return True
 
 
-def populate_board(board: [[str]], ships: [str] = list(SHIPS_LEN.keys())) -> [[str]]:
-    """Populate board with a selection of ships"""
-    # TODO: populate docstring
+def populate_board(
+    board: bytearray, ships: [str] = list(SHIPS_LEN.keys()), rng: Random = RNG
+) -> bytearray:
+    """Populate board with a selection of ships
+
+    Each ship tries the precomputed in-bounds placements for its length in a random
+    order and takes the first one that doesn't overlap an already placed ship.
+
+    Pass a seeded `rng` to get a reproducible board.
+    """
     for ship in ships:
+        candidates = PLACEMENTS[SHIPS_LEN[ship]]
 
-        placed = False
-        while not placed:
-            row, col = randint(0, 9), randint(0, 9)
-            orientation = randint(0, 1)
-            placed, board = place_ship(
-                row, col, board, ship, {1: "v", 0: "h"}[orientation]
-            )
+        for row, col, orientation in rng.sample(candidates, len(candidates)):
+            placed, board = place_ship(row, col, board, ship, orientation)
+            if placed:
+                break
+        else:
+            raise ValueError(f"Could not find a free placement for ship {ship}")
 
     return board
 
 
-def get_state(board: [[str]], filler="~") -> [(str, int, int)]:
+def get_state(board: bytearray, filler="~") -> [(str, int, int)]:
     """Dump the state of the board into an array of tuples"""
     state = []
-    for ri, row in enumerate(board):
-        for ci, col in enumerate(row):
-            if col != "~":
-                state.append((col, ri, ci))
+    for idx, entry in enumerate(board):
+        if entry != ord(filler):
+            state.append((chr(entry), *divmod(idx, 10)))
 
     return state
 
 
-def set_state(board: [[str]], state: [(str, int, int)]) -> [(str, int, int)]:
+def get_ship_mask(board: bytearray, ignore=b"@X~") -> int:
+    """Pack the board into a bitmask of the cells that still hold an unhit ship
+
+    Bit `row * 10 + col` is set when that cell isn't the miss, filler or hit
+    """
+    return sum(1 << idx for idx, entry in enumerate(board) if entry not in ignore)
+
+
+def set_state(board: bytearray, state: [(str, int, int)]) -> bytearray:
     """Take in a state in the required format and load it into the board"""
     for ship, ri, ci in state:
-        board[ri][ci] = ship
+        board[ri * 10 + ci] = ord(ship)
     return board
 
 
@@ -162,7 +203,7 @@ def io_print_sleep(text: str, s: int) -> None:
         sleep(1)
 
 
-def io_validate_input(val, valid=list(map(str, range(10)))):
+def io_validate_input(val, valid=VALID_INPUTS):
     """Sanitize imputs
 
     Returns a boolean representing the validity and the value
@@ -175,36 +216,51 @@ def io_validate_input(val, valid=list(map(str, range(10)))):
     return (True, val) if val in valid else (False, val)
 
 
-def io_save_board(board: [[str]], filename: str = "checkpoint.sav") -> bool:
+def io_save_board(board: bytearray, filename: str = "checkpoint.sav") -> bool:
     """Save the state of the board to file
 
     It will be saved in the format `(ship, row_index, column_index)`
     Avoids us storing null's
     """
     with open(filename, "w+") as handle:
-        handle.writelines(map(lambda row: str(row) + "\n", get_state(board)))
+        handle.write("".join(f"{entry}\n" for entry in get_state(board)))
 
     return True
 
 
-def io_load_board(filename: str = "checkpoint.sav", custom_filler="~") -> [[str]]:
+def io_load_board(filename: str = "checkpoint.sav", custom_filler="~") -> bytearray:
     """Load the state of the board from file
 
     Loads in a file exported by `io_save_board` and shoves it into a new board
     """
-    board: [[str]] = generate_board(filler=custom_filler)
+
+    def _parse(line: str) -> (str, int, int):
+        # lines look like `('A', 3, 4)`
+        ship, row, col = line.strip()[1:-1].split(", ")
+        return (ship.strip("'"), int(row), int(col))
+
+    board: bytearray = generate_board(filler=custom_filler)
     with open(filename, "r") as handle:
         state = handle.read().splitlines()
 
-    full_board = set_state(board, [eval(e) for e in state])
+    full_board = set_state(board, [_parse(e) for e in state if e.strip()])
 
     return full_board
 
 
+@lru_cache(maxsize=None)
+def io_read_screen(filename: str) -> str:
+    """Read a screen template from file
+
+    The screens don't change while the game runs so each file is only read once
+    """
+    with open(filename, "r") as handle:
+        return handle.read()
+
+
 def io_render_main_menu(main_menu_file: str = "main_menu", radar=False) -> bool:
     """Load the main menu from file and print it to the screen"""
-    with open(main_menu_file, "r") as handle:
-        menu = handle.read()
+    menu = io_read_screen(main_menu_file)
 
     radar = "on" if radar else "off"
     print(menu.format(radar))
@@ -212,20 +268,19 @@ def io_render_main_menu(main_menu_file: str = "main_menu", radar=False) -> bool:
     return True
 
 
-def io_render_board(board: [[str]], sep=" | ") -> None:
+def io_render_board(board: bytearray, sep=" | ") -> None:
     """Renders the board"""
 
-    def _format(s1, s2):
-        return s1 + sep + s2
+    rows = [sep.join(board[i : i + 10].decode()) for i in range(0, len(board), 10)]
 
-    l = len(reduce(_format, board[0]))
+    l = len(rows[0])
     dash = lambda: print("   ", "-" * (l + 2))
 
-    print("     0 | 1 | 2 | 3 | 4 | 5 | 6 | 7 | 8 | 9 ")
+    print("     " + sep.join(map(str, range(10))))
 
-    for i, row in enumerate(board):
+    for i, row in enumerate(rows):
         dash()
-        print(f"{i}.  ", reduce(_format, row))
+        print(f"{i}.  ", row)
 
     dash()
 
@@ -287,131 +342,125 @@ def io_clear_save() -> bool:
         os.remove("checkpoint.sav")
         return True
     except Exception as e:
-        log.debug(f"Got error in clearing save: {e}")
+        log.debug("Got error in clearing save: %s", e)
         return False
 
 
 def io_win_screen():
     """Handles rendering of the win screen"""
     io_clear_screen()
-    with open("win_screen", "r") as handle:
-        print(handle.read())
+    print(io_read_screen("win_screen"))
     input("Press enter to continue")
     io_main_menu("Nice one, let's go again?")
 
 
 def io_clear_screen() -> None:
-    """Clears the screen in the terminal"""
-    # TODO: replace with something more robust
-    print(chr(27) + "[2J")  # clears screen
+    """Clears the screen in the terminal
+
+    Writes the escape bytes straight to the binary buffer when stdout has one, otherwise
+    (StringIO redirects, IDLE) falls back to a plain text write
+    """
+    buffer = getattr(sys.stdout, "buffer", None)
+    if buffer is None:
+        sys.stdout.write(CLEAR_SCREEN.decode())
+        sys.stdout.flush()
+        return
 
+    sys.stdout.flush()  # don't let pending text land after the clear
+    buffer.write(CLEAR_SCREEN)
+    buffer.flush()  # show the clear now, not when the buffer next fills
 
-def get_turn(board: [[str]], only: [[str]] = ["@", "X"]) -> None:
-    unfolded = [entry for row in board for entry in row]
-    return (
-        sum(filter(lambda i: i, map(lambda e: e in only, unfolded))) + 1
-    )  # add one as it starts from 0
 
+def get_turn(board: bytearray, only: bytes = b"@X") -> int:
+    return sum(map(board.count, only)) + 1  # add one as it starts from 0
 
-def mask_board(board: [[str]], extra: [str] = ["@", "X"], filler: str = "~") -> [[str]]:
+
+def mask_board(board: bytearray, extra: bytes = b"@X", filler: str = "~") -> bytearray:
     """Mask certain elements from the board with the filler character
 
     Useful when we show the user the board
     """
-    return [
-        [component if component in ([filler] + extra) else filler for component in row]
-        for row in board
-    ]
+    return board.translate(_mask_table(filler.encode() + extra, ord(filler)))
+
 
+@lru_cache(maxsize=None)
+def _mask_table(keep: bytes, filler: int) -> bytes:
+    """Translation table passing through the bytes in `keep` and mapping all others to filler"""
+    return bytes(b if b in keep else filler for b in range(256))
 
-def game_loop(board: [[str]], cheats: bool, radar, filler: str = "~", turns=20) -> None:
+
+def game_loop(
+    board: bytearray,
+    cheats: bool,
+    radar,
+    filler: str = "~",
+    turns=20,
+) -> None:
     """Main game loop with user input and rendering"""
 
-    def _save_main_menu(inp: str) -> None:
+    def _save_main_menu(inp: str) -> bool:
         if inp == "m":
             io_save_board(board)
             io_main_menu("Game saved", radar=radar)
+            return True
+        return False
 
-    if win_condition(board):
-        io_clear_save()
-        io_win_screen()
-
-    turn = get_turn(board)
-    if turn == turns:
-        io_clear_save()
-        io_main_menu("You ran out of ammo, try again", radar=radar)
-
-    io_clear_screen()
-    print("Input `m` to save and go to the main menu")
-    print(f"Turn: {turn}/{turns}\n")
-
+    # masked view shown to the player, updated one cell at a time as guesses land
     user_board = mask_board(board)
-    io_render_board(user_board)
+    # unhit ship cells, so winning and radar checks are single integer ops
+    ships = get_ship_mask(board)
 
-    if cheats:
-        print("-" * 80)
-        io_render_board(board)
+    while True:
+        if not ships:
+            io_clear_save()
+            io_win_screen()
+            return
 
-    _validr, _r = io_validate_input(input("Please enter a row: "))
-    _save_main_menu(_r)  # save and exit to main menu if choice == "m"
+        turn = get_turn(board)
+        if turn == turns:
+            io_clear_save()
+            io_main_menu("You ran out of ammo, try again", radar=radar)
+            return
 
-    _validc, _c = io_validate_input(input("Please enter a col: "))
-    _save_main_menu(_c)  # save and exit to main menu if choice == "m"
+        io_clear_screen()
+        print("Input `m` to save and go to the main menu")
+        print(f"Turn: {turn}/{turns}\n")
 
-    if _validr and _validc:
-        r: int = int(_r)
-        c: int = int(_c)
-    else:
-        io_print_sleep("Sorry, incorrect input", s=2)
-        game_loop(board, cheats, radar)
+        io_render_board(user_board)
 
-    hit_miss: str = board[r][c]
+        if cheats:
+            print("-" * 80)
+            io_render_board(board)
 
-    # TODO: need to ensure that if i already guessed here, we keep going
+        _validr, _r = io_validate_input(input("Please enter a row: "))
+        if _save_main_menu(_r):  # save and exit to main menu if choice == "m"
+            return
 
-    if (hit_miss == "@") or (hit_miss == "X"):
-        io_print_sleep("You have already targeted this area", s=2)
-        game_loop(board, cheats, radar)
+        _validc, _c = io_validate_input(input("Please enter a col: "))
+        if _save_main_menu(_c):  # save and exit to main menu if choice == "m"
+            return
 
-    elif (hit_miss != filler) and (hit_miss != "@"):
-        board[r][c] = "X"
+        if _validr and _validc:
+            r: int = int(_r)
+            c: int = int(_c)
+        else:
+            io_print_sleep("Sorry, incorrect input", s=2)
+            continue
 
-        if radar and radar_scan(board, r, c):
-            io_print_sleep("Enemy nearby!", 2)
+        idx: int = r * 10 + c
+        hit_miss: str = chr(board[idx])
 
-        game_loop(board, cheats, radar)
+        if (hit_miss == "@") or (hit_miss == "X"):
+            io_print_sleep("You have already targeted this area", s=2)
+            continue
 
-    elif hit_miss == filler:
-        board[r][c] = "@"
+        mark = ord("@") if hit_miss == filler else ord("X")
+        board[idx] = user_board[idx] = mark
+        ships &= ~(1 << idx)
 
-        if radar and radar_scan(board, r, c):
+        if radar and ships & NEIGHBOR_MASKS[idx]:
             io_print_sleep("Enemy nearby!", 2)
 
-        game_loop(board, cheats, radar)
-
-    else:
-        game_loop(board, cheats, radar)
-
-
-def radar_scan(board: [[str]], r: int, c: int, ignore=["@", "X", "~"]) -> None:
-    """Check if any entries one block away from the guess have ships"""
-    valid = (
-        lambda t: (r + t[0] < 10)
-        and (c + t[0] > -1)
-        and (r + t[1] < 10)
-        and (c + t[1] > -1)
-    )
-    entries = filter(valid, it.product(range(-1, 2), range(-1, 2)))
-    check = lambda t: board[r + t[0]][c + t[1]] not in ignore
-    aa = map(check, entries)
-    return any(aa)
-
-
-def win_condition(board: [[str]], ignore=["X", "@", "~"]) -> None:
-    """Check if the board contains entries that aren't the miss, filler or hit"""
-    unfolded = [entry for row in board for entry in row]
-    return all(map(lambda entry: entry in ignore, unfolded))
-
 
 if __name__ == "__main__":
     io_main_menu()